@@ -1,12 +1,28 @@
 import numpy as np
-import math
-import copy
 import random
 import pickle
 import os
-from tqdm import tqdm
+from functools import lru_cache
 import matplotlib.pyplot as plt
 
+try:
+    from sa_core_nb import sa_core, multistart_core, solve_exact_core
+except ImportError as e:
+    # Only a missing Numba means the fallback is wanted; any other import error is a real bug.
+    if e.name != 'numba':
+        raise
+    # Without Numba, compile the Cython version of the kernels on first import (this needs a C compiler).
+    try:
+        import pyximport
+    except ImportError:
+        raise ImportError("No simulated annealing backend is installed. Install the 'numba' extra "
+                          "(poetry install -E numba), or the 'cython' extra where Numba is not available.") from None
+    pyximport.install(language_level=3)
+    from sa_core_cy import sa_core, multistart_core, solve_exact_core
+
+# Up to this many guests the exact solver is fast enough, so simulated annealing is only used for bigger parties.
+EXACT_MAX_GUESTS = 18
+
 def modify_relations():
     """
     Prompts the user to enter the names of two persons and their new relationship level.
@@ -31,22 +47,14 @@ def display_arrangement_in_circle(arrangement):
     :return: None
     """
     n = len(arrangement)
-    x_values = []
-    y_values = []
-    labels = []
-
-    angle = 2 * math.pi / n
-    for i in range(n):
-        x = 10 * math.cos(i * angle)
-        y = 10 * math.sin(i * angle)
-        x_values.append(x)
-        y_values.append(y)
-        labels.append(arrangement[i])
+    theta = 2 * np.pi * np.arange(n) / n
+    x_values = 10 * np.cos(theta)
+    y_values = 10 * np.sin(theta)
 
     plt.figure(figsize=(10,10))
     plt.scatter(x_values, y_values)
-    for i, name in enumerate(labels):
-        plt.annotate(name, (x_values[i], y_values[i]), fontsize=20)
+    for name, x, y in zip(arrangement, x_values, y_values):
+        plt.annotate(name, (x, y), fontsize=20)
     plt.title("Guest Seating Arrangement")
     plt.xlabel("X")
     plt.ylabel("Y")
@@ -54,70 +62,212 @@ def display_arrangement_in_circle(arrangement):
 
 
 
-def get_total_familiarity(arrangement):
+def get_familiarity_triangle(sign=1):
+    """
+    Flatten the upper triangle of the familiarity matrix, row by row (see `tri_index`).
+
+    :param sign: 1 to keep the ratings, -1 to negate them for minimizing. Default value is 1.
+    :return: The flat upper-triangle familiarity array.
+    :rtype: numpy.ndarray
     """
-    Calculate the total familiarity of a given arrangement.
+    return sign * familiarity[np.triu_indices(len(familiarity), k=1)]
+
 
-    :param arrangement: A list representing the seating arrangement of guests.
-    :type arrangement: list
-    :return: The total familiarity score of the arrangement.
+def get_max_move_delta():
+    """
+    Calculate the biggest change in total familiarity a single move can make.
+
+    A swap changes at most 4 edges (a 2-opt reversal only 2), so the total familiarity moves by at most 4 times the
+    spread of the ratings.
+
+    :return: The bound on the change in total familiarity.
     :rtype: int
     """
-    total = 0
-    for i in range(len(arrangement)):
-        total += familiarity[guests.index(arrangement[i]), guests.index(arrangement[(i + 1) % len(arrangement)])]
-    return total
+    ratings = get_familiarity_triangle()
+    return 4 * int(ratings.max() - ratings.min())
 
 
-def simulated_annealing(arrangement, optimize='min', T=5000, T_min=0.01, alpha=0.9):
+@lru_cache
+def get_acceptance_thresholds(T, T_min, n_temperatures, max_delta, reheats=0):
+    """
+    Precompute the Metropolis acceptance probabilities for every temperature level of the cooling schedule.
+
+    The temperature is cooled exponentially from T down to T_min over n_temperatures levels, and the annealing loop
+    makes a fixed number of moves at each level, so the number of iterations is set directly instead of following
+    from the reduction factor while the table stays small however long the runs are. With reheats, the levels are
+    split into reheats + 1 equal stretches; every stretch after the first starts again from half the initial
+    temperature and cools down to T_min.
+
+    Row k holds exp(-d / T_k) for a move that makes the total familiarity d worse, d = 0 ... max_delta, at the k-th
+    level. The table only depends on the schedule, so it is built once and shared by every annealing run. It is
+    read-only so that no caller can change the schedule for everyone else.
+
+    :param T: The initial temperature.
+    :param T_min: The minimum temperature.
+    :param n_temperatures: The number of temperature levels.
+    :param max_delta: The biggest change in total familiarity a single move can make.
+    :param reheats: The number of times the temperature is raised again. Default value is 0.
+    :return: The read-only acceptance probabilities, one row per temperature level.
+    :rtype: numpy.ndarray
+    :raises ValueError: If there are fewer temperature levels than stretches of the schedule.
+    """
+    if n_temperatures < reheats + 1:
+        raise ValueError(f"the schedule has {n_temperatures} temperature levels, but {reheats} reheats need at least "
+                         f"{reheats + 1}; raise n_iters or lower steps_per_temperature")
+    temperatures = []
+    for k, stretch in enumerate(np.array_split(np.arange(n_temperatures), reheats + 1)):
+        start = T if k == 0 else T / 2
+        alpha = (T_min / start) ** (1 / len(stretch))
+        temperatures.append(start * alpha ** np.arange(len(stretch)))
+    thresholds = np.exp(-np.arange(max_delta + 1) / np.concatenate(temperatures).reshape(-1, 1))
+    thresholds.flags.writeable = False
+    return thresholds
+
+
+def get_greedy_arrangement(optimize='min'):
+    """
+    Build a seating arrangement greedily, as a warm start for simulated annealing.
+
+    Starting from guest 0, the next seat always goes to the unseated guest with the highest (for maximizing) or
+    lowest (for minimizing) familiarity with the guest just seated.
+
+    :param optimize: The optimization criteria. Possible values are 'min' (default) and 'max'.
+    :return: The greedy arrangement as a NumPy array of guest indices.
+    :rtype: numpy.ndarray
+    """
+    sign = 1 if optimize == 'max' else -1
+    scores = sign * familiarity.astype(np.int64)
+    n = len(familiarity)
+    seated = np.zeros(n, dtype=bool)
+    arrangement = np.empty(n, dtype=np.int8)
+    current = 0
+    for seat in range(n):
+        arrangement[seat] = current
+        seated[current] = True
+        current = np.argmax(np.where(seated, np.iinfo(np.int64).min, scores[current]))
+    return arrangement
+
+
+def simulated_annealing(arrangement, optimize='min', T=None, T_min=0.01, n_iters=10000, reheats=0,
+                        steps_per_temperature=100, seed=None, two_opt=True):
     """
     Simulated Annealing
 
-    :param arrangement: The initial arrangement of elements.
+    :param arrangement: The initial arrangement as a NumPy array of guest indices. It is not modified.
     :param optimize: The optimization criteria. Possible values are 'min' (default) and 'max'.
-    :param T: The initial temperature. Default value is 5000.
+    :param T: The initial temperature. When it is None (default), the spread of the ratings is used.
     :param T_min: The minimum temperature. Default value is 0.01.
-    :param alpha: The temperature reduction factor. Default value is 0.9.
-    :return: The optimized arrangement.
+    :param n_iters: The number of iterations, rounded up to a whole number of temperature levels. Default value is
+        10000.
+    :param reheats: The number of times the temperature is raised again to half its initial value. Default value is 0.
+    :param steps_per_temperature: The number of moves made at each temperature level. Default value is 100.
+    :param seed: The seed of the random number generator. A random seed is picked when it is None (default).
+    :param two_opt: True (default) to use 2-opt reversal moves, False to use swap moves.
+    :return: The optimized arrangement and its total familiarity.
 
     Simulated annealing is a probabilistic optimization algorithm that is used to find the minimum or maximum of a
     function by gradually reducing the temperature. It is based on the concept * of simulated annealing in
     metallurgy, where a material is cooled slowly to reduce defects and improve overall structure.
 
     The `simulated_annealing` method takes an initial arrangement and performs simulated annealing to optimize the
-    arrangement based on a given optimization criteria. During the annealing process, two elements in the
-    arrangement are randomly swapped and the total familiarity of the arrangement is calculated. The arrangement is
-    updated if the total familiarity increases (for maximizing) or decreases (for minimizing), or based on a
-    probability determined by the temperature and the change in familiarity. The temperature is reduced over time
-    using a temperature reduction factor.
+    arrangement based on a given optimization criteria. During the annealing process, two seats in the
+    arrangement are randomly picked and the change in total familiarity of reversing the guests between them (or of
+    swapping the two guests) is calculated from the edges around the two seats only. The move is made if the total
+    familiarity increases (for maximizing) or decreases (for minimizing), or based on a probability determined by
+    the temperature and the change in familiarity. By default the temperature starts at the spread of the ratings,
+    so that early moves that make things worse are accepted often but not always. The temperature is reduced
+    exponentially so that it reaches the minimum temperature after the given number of iterations, optionally with
+    reheats in between. The loop itself runs in `sa_core`, which is compiled with Numba (or Cython when Numba is not installed) and looks the acceptance
+    probabilities up in a table precomputed for the whole cooling schedule.
 
-    The method runs until the temperature reaches the minimum temperature. The final optimized arrangement is returned.
+    The method runs for the given number of iterations. The final optimized arrangement is returned together
+    with its total familiarity, which is tracked during the run so it never has to be recomputed.
 
     Example usage:
     ```
-    initial_arrangement = [1, 2, 3, 4, 5]
-    optimized_arrangement = simulated_annealing(initial_arrangement)
-    print(optimized_arrangement)
+    initial_arrangement = np.arange(5, dtype=np.int8)
+    optimized_arrangement, total_familiarity = simulated_annealing(initial_arrangement)
+    print(optimized_arrangement, total_familiarity)
     ```
     """
-    while T > T_min:
-        new_arrangement = copy.deepcopy(arrangement)
-        i, j = random.sample(range(len(arrangement)), 2)
-        new_arrangement[i], new_arrangement[j] = new_arrangement[j], new_arrangement[i]
+    seats = np.array(arrangement, dtype=np.int8)
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    n_temperatures = -(-n_iters // steps_per_temperature)
+    max_delta = get_max_move_delta()
+    if T is None:
+        T = max(max_delta / 4, T_min)
+    thresholds = get_acceptance_thresholds(T, T_min, n_temperatures, max_delta, reheats)
+    sign = 1 if optimize == 'max' else -1
+    total_familiarity = sa_core(seats, get_familiarity_triangle(sign), thresholds, steps_per_temperature, seed,
+                                two_opt)
+    return seats, sign * int(total_familiarity)
 
-        current_familiarity = get_total_familiarity(arrangement)
-        new_familiarity = get_total_familiarity(new_arrangement)
 
-        delta = new_familiarity - current_familiarity
-        try:
-            accept_probability = math.exp(-delta / T)
-        except OverflowError:
-            accept_probability = 0
+def multistart(arrangement, optimize='min', n_runs=100, T=None, T_min=0.01, n_iters=10000, reheats=0,
+               steps_per_temperature=100, seed=None, two_opt=True, perturb_swaps=3, device=None):
+    """
+    Run simulated annealing several times from the same arrangement and keep the best result.
 
-        if (delta < 0 and optimize == 'min') or (delta > 0 and optimize == 'max') or random.random() < accept_probability:
-            arrangement = new_arrangement
-        T = T * alpha
-    return arrangement
+    Every run starts from its own copy of the arrangement with a few random seats swapped, so that runs started from
+    a good warm start (see `get_greedy_arrangement`) still explore different parts of the search space.
+
+    The runs are independent, so with Numba they are spread over all CPU cores by `multistart_core`. The Cython
+    fallback runs them one after another. Given a device, all runs advance together as one batch of PyTorch tensor
+    operations instead, which pays off on a GPU for big parties or many runs.
+
+    :param arrangement: The initial arrangement as a NumPy array of guest indices. It is not modified.
+    :param optimize: The optimization criteria. Possible values are 'min' (default) and 'max'.
+    :param n_runs: The number of simulated annealing runs. Default value is 100.
+    :param T: The initial temperature. When it is None (default), the spread of the ratings is used.
+    :param T_min: The minimum temperature. Default value is 0.01.
+    :param n_iters: The number of iterations, rounded up to a whole number of temperature levels. Default value is
+        10000.
+    :param reheats: The number of times the temperature is raised again to half its initial value. Default value is 0.
+    :param steps_per_temperature: The number of moves made at each temperature level. Default value is 100.
+    :param seed: The seed of the first run. A random seed is picked when it is None (default).
+    :param two_opt: True (default) to use 2-opt reversal moves, False to use swap moves.
+    :param perturb_swaps: The number of random swaps applied to each run's starting arrangement. Default value is 3.
+    :param device: The PyTorch device to run on, e.g. 'cuda'. The CPU kernels are used when it is None (default).
+    :return: The best arrangement found and its total familiarity.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    starts = np.tile(np.array(arrangement, dtype=np.int8), (n_runs, 1))
+    rng = np.random.default_rng(seed)
+    runs = np.arange(n_runs)
+    for _ in range(perturb_swaps):
+        i, j = rng.integers(len(arrangement), size=(2, n_runs))
+        starts[runs, i], starts[runs, j] = starts[runs, j], starts[runs, i]
+    n_temperatures = -(-n_iters // steps_per_temperature)
+    max_delta = get_max_move_delta()
+    if T is None:
+        T = max(max_delta / 4, T_min)
+    thresholds = get_acceptance_thresholds(T, T_min, n_temperatures, max_delta, reheats)
+    sign = 1 if optimize == 'max' else -1
+    if device is not None:
+        import sa_core_torch
+        best_arrangement, best_familiarity = sa_core_torch.multistart_core(starts, sign * familiarity, thresholds,
+                                                                           steps_per_temperature, seed, two_opt, device)
+    else:
+        tri = get_familiarity_triangle(sign)
+        best_arrangement, best_familiarity = multistart_core(starts, tri, thresholds, steps_per_temperature, seed,
+                                                             two_opt)
+    return best_arrangement, sign * int(best_familiarity)
+
+
+def solve_exact(optimize='min'):
+    """
+    Find the provably best arrangement with the Held-Karp dynamic programme.
+
+    The memory use doubles with every extra guest, so this is meant for parties of up to `EXACT_MAX_GUESTS`.
+
+    :param optimize: The optimization criteria. Possible values are 'min' (default) and 'max'.
+    :return: The best arrangement as a NumPy array of guest indices and its total familiarity.
+    """
+    sign = 1 if optimize == 'max' else -1
+    best_arrangement, best_familiarity = solve_exact_core(sign * familiarity)
+    return best_arrangement, sign * int(best_familiarity)
 
 
 
@@ -150,23 +300,23 @@ if __name__ == '__main__':
         with open('relation_data.pkl', 'wb') as f:
             pickle.dump(relation, f)
 
-    familiarity = np.ones((15, 15)) * 5
-    for i in range(len(guests)):
-        for j in range(i + 1, len(guests)):
-            familiarity[i][j] = relation[(guests[i], guests[j])]
-            familiarity[j][i] = familiarity[i][j]
-
-    initial_arrangement = guests
+    n = len(guests)
+    iu, ju = np.triu_indices(n, k=1)
+    values = np.fromiter((relation[(guests[i], guests[j])] for i, j in zip(iu, ju)), dtype=np.int8, count=len(iu))
+    familiarity = np.zeros((n, n), dtype=np.int8)
+    familiarity[iu, ju] = values
+    familiarity += familiarity.T
 
     # Use 'max' for maximizing and 'min' for minimizing total familiarity
-    best_arrangement = initial_arrangement
-    best_familiarity = get_total_familiarity(best_arrangement)
-    for _ in tqdm(range(1000)):
-        optimal_arrangement = simulated_annealing(initial_arrangement, what_you_want_to_get)
-        if (what_you_want_to_get == 'min' and get_total_familiarity(optimal_arrangement) < best_familiarity) or (what_you_want_to_get == 'max' and get_total_familiarity(optimal_arrangement) > best_familiarity):
-            best_arrangement = optimal_arrangement
-            best_familiarity = get_total_familiarity(best_arrangement)
-
-    print('Optimal arrangement:', best_arrangement)
+    if n <= EXACT_MAX_GUESTS:
+        best_arrangement, best_familiarity = solve_exact(what_you_want_to_get)
+    else:
+        print('Running 100 simulated annealing runs...')
+        initial_arrangement = get_greedy_arrangement(what_you_want_to_get)
+        best_arrangement, best_familiarity = multistart(initial_arrangement, what_you_want_to_get, n_runs=100)
+        print('Done.')
+
+    best_guests = [guests[i] for i in best_arrangement]
+    print('Optimal arrangement:', best_guests)
     print('Total familiarity:', best_familiarity)
-    display_arrangement_in_circle(best_arrangement)
+    display_arrangement_in_circle(best_guests)
@@ -0,0 +1,197 @@
+"""
+The simulated annealing and exact solver kernels, in Cython.
+
+This is the fallback for environments without Numba. It mirrors `sa_core_nb.py` function for function and draws
+the same random numbers, so both give the same results for the same seed.
+"""
+import numpy as np
+
+cimport cython
+from libc.stdint cimport int64_t, uint64_t
+
+
+cdef inline uint64_t xorshift64(uint64_t state) noexcept nogil:
+    """
+    Advance a xorshift64 random number generator by one step.
+    """
+    state ^= state << 13
+    state ^= state >> 7
+    state ^= state << 17
+    return state
+
+
+cdef inline int edge(const signed char* tri, Py_ssize_t x, Py_ssize_t y, Py_ssize_t n) noexcept nogil:
+    """
+    Look up the familiarity of guests x and y in a flat upper-triangle familiarity array.
+    """
+    if x > y:
+        x, y = y, x
+    return tri[x * (2 * n - x - 1) // 2 + y - x - 1]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def sa_core(signed char[:] a, const signed char[:] tri, const double[:, :] thresholds, Py_ssize_t steps_per_temperature,
+            uint64_t seed, bint two_opt):
+    """
+    The simulated annealing loop.
+
+    :param a: A NumPy array of guest indices. It is optimized in place.
+    :param tri: The flat upper triangle of the familiarity matrix, negated when minimizing.
+    :param thresholds: The acceptance probabilities from `get_acceptance_thresholds`, one row per temperature level.
+    :param steps_per_temperature: The number of moves made at each temperature level.
+    :param seed: The seed of the random number generator.
+    :param two_opt: True to use 2-opt reversal moves, False to use swap moves.
+    :return: The total familiarity of the optimized arrangement under tri.
+    :rtype: int
+    """
+    cdef const signed char* t = &tri[0]
+    cdef Py_ssize_t n = a.shape[0]
+    cdef Py_ssize_t level, step, k, i, j, lo, hi
+    cdef signed char before_i, after_j
+    cdef int delta
+    cdef int64_t current_familiarity
+    cdef bint accept
+    # Mix the seed so that small seeds still give a well spread, non-zero state.
+    cdef uint64_t state = seed ^ 0x9E3779B97F4A7C15ULL
+
+    current_familiarity = edge(t, a[n - 1], a[0], n)
+    for k in range(n - 1):
+        current_familiarity += edge(t, a[k], a[k + 1], n)
+
+    with nogil:
+        for level in range(thresholds.shape[0]):
+            for step in range(steps_per_temperature):
+                # Both seats come from one draw; j is picked among the other n - 1 seats, so it never equals i.
+                state = xorshift64(state)
+                i = <int64_t>(state >> 32) % n
+                j = <int64_t>(state & 0xFFFFFFFFULL) % (n - 1)
+                if j >= i:
+                    j += 1
+                if i > j:
+                    i, j = j, i
+
+                # Since i < j, only seat i can wrap to the left and only seat j to the right.
+                before_i = a[i - 1] if i > 0 else a[n - 1]
+                after_j = a[j + 1] if j + 1 < n else a[0]
+                if two_opt:
+                    if i == 0 and j == n - 1:
+                        # Reversing the whole table leaves every neighbour in place.
+                        continue
+                    delta = ((edge(t, before_i, a[j], n) + edge(t, a[i], after_j, n))
+                             - (edge(t, before_i, a[i], n) + edge(t, a[j], after_j, n)))
+                # Only the edges touching seats i and j change. When the two seats are neighbours the edge between
+                # them stays the same, so just the two outer edges are looked at.
+                elif j == i + 1:
+                    delta = ((edge(t, before_i, a[j], n) + edge(t, a[i], after_j, n))
+                             - (edge(t, before_i, a[i], n) + edge(t, a[j], after_j, n)))
+                elif i == 0 and j == n - 1:
+                    delta = ((edge(t, a[j - 1], a[i], n) + edge(t, a[j], a[i + 1], n))
+                             - (edge(t, a[j - 1], a[j], n) + edge(t, a[i], a[i + 1], n)))
+                else:
+                    delta = ((edge(t, before_i, a[j], n) + edge(t, a[j], a[i + 1], n)
+                              + edge(t, a[j - 1], a[i], n) + edge(t, a[i], after_j, n))
+                             - (edge(t, before_i, a[i], n) + edge(t, a[i], a[i + 1], n)
+                                + edge(t, a[j - 1], a[j], n) + edge(t, a[j], after_j, n)))
+
+                accept = delta > 0
+                if not accept:
+                    # The top 53 bits of the next draw give a uniform float in [0, 1).
+                    state = xorshift64(state)
+                    accept = <double>(state >> 11) * (1.0 / 9007199254740992.0) < thresholds[level, -delta]
+                if accept:
+                    if two_opt:
+                        lo = i
+                        hi = j
+                        while lo < hi:
+                            a[lo], a[hi] = a[hi], a[lo]
+                            lo += 1
+                            hi -= 1
+                    else:
+                        a[i], a[j] = a[j], a[i]
+                    current_familiarity += delta
+    return current_familiarity
+
+
+def multistart_core(starts, tri, thresholds, steps_per_temperature, seed, two_opt):
+    """
+    Run independent simulated annealing runs one after another.
+
+    :param starts: A NumPy array with one row of guest indices per run, which that run starts from. It is not
+        modified.
+    :param tri: The flat upper triangle of the familiarity matrix, negated when minimizing.
+    :param thresholds: The acceptance probabilities from `get_acceptance_thresholds`, one row per temperature level.
+    :param steps_per_temperature: The number of moves made at each temperature level.
+    :param seed: The seed of the first run. Run k is seeded with seed + k.
+    :param two_opt: True to use 2-opt reversal moves, False to use swap moves.
+    :return: The best arrangement found by any run and its total familiarity under tri.
+    :rtype: tuple
+    """
+    n_runs = starts.shape[0]
+    arrangements = starts.copy()
+    familiarities = np.empty(n_runs, dtype=np.int64)
+    for k in range(n_runs):
+        familiarities[k] = sa_core(arrangements[k], tri, thresholds, steps_per_temperature, seed + k, two_opt)
+
+    best = np.argmax(familiarities)
+    return arrangements[best].copy(), familiarities[best]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def solve_exact_core(const signed char[:, :] F):
+    """
+    Find the best arrangement with the Held-Karp dynamic programme.
+
+    See `sa_core_nb.solve_exact_core` for how the table is laid out.
+
+    :param F: The familiarity matrix, negated when minimizing.
+    :return: The best arrangement and its total familiarity under F.
+    :rtype: tuple
+    """
+    cdef Py_ssize_t n = F.shape[0]
+    # Guest 0 is left out of the masks, so bit j stands for guest j + 1.
+    cdef Py_ssize_t m = n - 1
+    cdef Py_ssize_t full = (1 << m) - 1
+    cdef int unreachable = -(1 << 30)
+    cdef Py_ssize_t mask, previous, j, k, seat, end
+    cdef int value, best_familiarity
+    dp_array = np.full((1 << m, m), unreachable, dtype=np.int32)
+    cdef int[:, :] dp = dp_array
+    for j in range(m):
+        dp[1 << j, j] = F[0, j + 1]
+    for mask in range(1, 1 << m):
+        for j in range(m):
+            if not (mask >> j) & 1 or dp[mask, j] == unreachable:
+                continue
+            for k in range(m):
+                if (mask >> k) & 1:
+                    continue
+                value = dp[mask, j] + F[j + 1, k + 1]
+                if value > dp[mask | (1 << k), k]:
+                    dp[mask | (1 << k), k] = value
+
+    # Close the circle back to guest 0.
+    end = 0
+    for j in range(1, m):
+        if dp[full, j] + F[j + 1, 0] > dp[full, end] + F[end + 1, 0]:
+            end = j
+    best_familiarity = dp[full, end] + F[end + 1, 0]
+
+    # Walk back through the table to recover the seats.
+    arrangement = np.empty(n, dtype=np.int8)
+    arrangement[0] = 0
+    mask = full
+    j = end
+    for seat in range(n - 1, 0, -1):
+        arrangement[seat] = j + 1
+        previous = mask ^ (1 << j)
+        if previous == 0:
+            break
+        for k in range(m):
+            if (previous >> k) & 1 and dp[previous, k] + F[k + 1, j + 1] == dp[mask, j]:
+                mask = previous
+                j = k
+                break
+    return arrangement, best_familiarity
@@ -0,0 +1,218 @@
+"""
+The simulated annealing and exact solver kernels, compiled with Numba.
+
+`sa_core_cy.pyx` implements the same functions in Cython for environments without Numba.
+"""
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def xorshift64(state):
+    """
+    Advance a xorshift64 random number generator by one step.
+
+    :param state: The current non-zero state as a NumPy uint64.
+    :return: The next state, which is also the random number drawn.
+    :rtype: numpy.uint64
+    """
+    state ^= state << np.uint64(13)
+    state ^= state >> np.uint64(7)
+    state ^= state << np.uint64(17)
+    return state
+
+
+@njit(inline='always')
+def tri_index(x, y, n):
+    """
+    Find where the pair of guests x and y is stored in a flat upper-triangle familiarity array.
+
+    The array holds the upper triangle of the familiarity matrix row by row, in the order of `np.triu_indices`.
+
+    :param x: The first guest index.
+    :param y: The second guest index. It must differ from x.
+    :param n: The number of guests.
+    :return: The position of the pair in the flat array.
+    :rtype: int
+    """
+    if x > y:
+        x, y = y, x
+    return x * (2 * n - x - 1) // 2 + y - x - 1
+
+
+@njit(inline='always')
+def edge(tri, x, y, n):
+    """
+    Look up the familiarity of guests x and y in a flat upper-triangle familiarity array.
+
+    :param tri: The flat upper-triangle familiarity array.
+    :param x: The first guest index.
+    :param y: The second guest index. It must differ from x.
+    :param n: The number of guests.
+    :return: The familiarity of the pair.
+    :rtype: int
+    """
+    return tri[tri_index(x, y, n)]
+
+
+@njit(cache=True)
+def sa_core(a, tri, thresholds, steps_per_temperature, seed, two_opt):
+    """
+    The simulated annealing loop, compiled with Numba.
+
+    The loop always maximizes, so the direction is never checked per move. To minimize, pass the negated ratings.
+    The familiarity matrix is symmetric, so only its upper triangle is passed, flattened (see `tri_index`).
+
+    A 2-opt move reverses the seats i ... j, which only replaces the edge entering seat i and the edge leaving seat j.
+    A swap move exchanges the guests at seats i and j, which replaces up to 4 edges.
+
+    :param a: A NumPy array of guest indices. It is optimized in place.
+    :param tri: The flat upper triangle of the familiarity matrix, negated when minimizing.
+    :param thresholds: The acceptance probabilities from `get_acceptance_thresholds`, one row per temperature level.
+    :param steps_per_temperature: The number of moves made at each temperature level.
+    :param seed: The seed of the random number generator.
+    :param two_opt: True to use 2-opt reversal moves, False to use swap moves.
+    :return: The total familiarity of the optimized arrangement under tri.
+    :rtype: int
+    """
+    # Mix the seed so that small seeds still give a well spread, non-zero state.
+    state = np.uint64(seed) ^ np.uint64(0x9E3779B97F4A7C15)
+    n = a.shape[0]
+    current_familiarity = np.int64(edge(tri, a[n - 1], a[0], n))
+    for k in range(n - 1):
+        current_familiarity += edge(tri, a[k], a[k + 1], n)
+
+    for level in range(thresholds.shape[0]):
+        for _ in range(steps_per_temperature):
+            # Both seats come from one draw; j is picked among the other n - 1 seats, so it never equals i.
+            state = xorshift64(state)
+            i = np.int64(state >> np.uint64(32)) % n
+            j = np.int64(state & np.uint64(0xFFFFFFFF)) % (n - 1)
+            if j >= i:
+                j += 1
+            if i > j:
+                i, j = j, i
+
+            # Since i < j, only seat i can wrap to the left and only seat j to the right; branches avoid a modulo.
+            before_i = a[i - 1] if i > 0 else a[n - 1]
+            after_j = a[j + 1] if j + 1 < n else a[0]
+            if two_opt:
+                if i == 0 and j == n - 1:
+                    # Reversing the whole table leaves every neighbour in place.
+                    continue
+                delta = ((edge(tri, before_i, a[j], n) + edge(tri, a[i], after_j, n))
+                         - (edge(tri, before_i, a[i], n) + edge(tri, a[j], after_j, n)))
+            # Only the edges touching seats i and j change. When the two seats are neighbours the edge between them
+            # stays the same, so just the two outer edges are looked at.
+            elif j == i + 1:
+                delta = ((edge(tri, before_i, a[j], n) + edge(tri, a[i], after_j, n))
+                         - (edge(tri, before_i, a[i], n) + edge(tri, a[j], after_j, n)))
+            elif i == 0 and j == n - 1:
+                delta = ((edge(tri, a[j - 1], a[i], n) + edge(tri, a[j], a[i + 1], n))
+                         - (edge(tri, a[j - 1], a[j], n) + edge(tri, a[i], a[i + 1], n)))
+            else:
+                delta = ((edge(tri, before_i, a[j], n) + edge(tri, a[j], a[i + 1], n)
+                          + edge(tri, a[j - 1], a[i], n) + edge(tri, a[i], after_j, n))
+                         - (edge(tri, before_i, a[i], n) + edge(tri, a[i], a[i + 1], n)
+                            + edge(tri, a[j - 1], a[j], n) + edge(tri, a[j], after_j, n)))
+
+            accept = delta > 0
+            if not accept:
+                # The top 53 bits of the next draw give a uniform float in [0, 1).
+                state = xorshift64(state)
+                accept = np.float64(state >> np.uint64(11)) * 2.0 ** -53 < thresholds[level, -delta]
+            if accept:
+                if two_opt:
+                    lo, hi = i, j
+                    while lo < hi:
+                        a[lo], a[hi] = a[hi], a[lo]
+                        lo += 1
+                        hi -= 1
+                else:
+                    a[i], a[j] = a[j], a[i]
+                current_familiarity += delta
+    return current_familiarity
+
+
+@njit(parallel=True, cache=True)
+def multistart_core(starts, tri, thresholds, steps_per_temperature, seed, two_opt):
+    """
+    Run independent simulated annealing runs in parallel, compiled with Numba.
+
+    Like `sa_core` it always maximizes; pass the negated ratings to minimize.
+
+    :param starts: A NumPy array with one row of guest indices per run, which that run starts from. It is not
+        modified.
+    :param tri: The flat upper triangle of the familiarity matrix, negated when minimizing.
+    :param thresholds: The acceptance probabilities from `get_acceptance_thresholds`, one row per temperature level.
+    :param steps_per_temperature: The number of moves made at each temperature level.
+    :param seed: The seed of the first run. Run k is seeded with seed + k.
+    :param two_opt: True to use 2-opt reversal moves, False to use swap moves.
+    :return: The best arrangement found by any run and its total familiarity under tri.
+    :rtype: tuple
+    """
+    n_runs = starts.shape[0]
+    arrangements = starts.copy()
+    familiarities = np.empty(n_runs, dtype=np.int64)
+    for k in prange(n_runs):
+        familiarities[k] = sa_core(arrangements[k], tri, thresholds, steps_per_temperature, seed + k, two_opt)
+
+    best = np.argmax(familiarities)
+    return arrangements[best].copy(), familiarities[best]
+
+
+@njit(cache=True)
+def solve_exact_core(F):
+    """
+    Find the best arrangement with the Held-Karp dynamic programme, compiled with Numba.
+
+    Like `sa_core` it always maximizes; pass the negated matrix to minimize. Guest 0 is fixed at seat 0, and
+    dp[mask, j] holds the best familiarity of a row of seats starting at guest 0, visiting the other guests in mask
+    and ending at guest j. This takes O(n^2 2^n) time and O(n 2^n) memory.
+
+    :param F: The familiarity matrix, negated when minimizing.
+    :return: The best arrangement and its total familiarity under F.
+    :rtype: tuple
+    """
+    n = F.shape[0]
+    # Guest 0 is left out of the masks, so bit j stands for guest j + 1.
+    m = n - 1
+    full = (1 << m) - 1
+    unreachable = -(1 << 30)
+    dp = np.full((1 << m, m), unreachable, dtype=np.int32)
+    for j in range(m):
+        dp[1 << j, j] = F[0, j + 1]
+    for mask in range(1, 1 << m):
+        for j in range(m):
+            if not (mask >> j) & 1 or dp[mask, j] == unreachable:
+                continue
+            for k in range(m):
+                if (mask >> k) & 1:
+                    continue
+                value = dp[mask, j] + F[j + 1, k + 1]
+                if value > dp[mask | (1 << k), k]:
+                    dp[mask | (1 << k), k] = value
+
+    # Close the circle back to guest 0.
+    end = 0
+    for j in range(1, m):
+        if dp[full, j] + F[j + 1, 0] > dp[full, end] + F[end + 1, 0]:
+            end = j
+    best_familiarity = dp[full, end] + F[end + 1, 0]
+
+    # Walk back through the table to recover the seats.
+    arrangement = np.empty(n, dtype=np.int8)
+    arrangement[0] = 0
+    mask = full
+    j = end
+    for seat in range(n - 1, 0, -1):
+        arrangement[seat] = j + 1
+        previous = mask ^ (1 << j)
+        if previous == 0:
+            break
+        for k in range(m):
+            if (previous >> k) & 1 and dp[previous, k] + F[k + 1, j + 1] == dp[mask, j]:
+                mask = previous
+                j = k
+                break
+    return arrangement, best_familiarity
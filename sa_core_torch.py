@@ -0,0 +1,83 @@
+"""
+The multistart simulated annealing kernel as batched tensor operations, with PyTorch.
+
+All runs advance together: each iteration draws one move per run, computes every delta with a few gathers and
+applies the accepted moves with a mask. This pays off on a GPU once there are many guests or many restarts.
+"""
+import numpy as np
+import torch
+
+
+def multistart_core(starts, F, thresholds, steps_per_temperature, seed, two_opt, device='cuda'):
+    """
+    Run independent simulated annealing runs as one batch of tensor operations.
+
+    Like `sa_core_nb.multistart_core` it always maximizes; pass the negated matrix to minimize. Unlike the CPU
+    kernels it takes the full familiarity matrix, since a gather from a square table is what the GPU is good at.
+
+    :param starts: A NumPy array with one row of guest indices per run, which that run starts from. It is not
+        modified.
+    :param F: The familiarity matrix, negated when minimizing.
+    :param thresholds: The acceptance probabilities from `get_acceptance_thresholds`, one row per temperature level.
+    :param steps_per_temperature: The number of moves made at each temperature level.
+    :param seed: The seed of the random number generator.
+    :param two_opt: True to use 2-opt reversal moves, False to use swap moves.
+    :param device: The PyTorch device to run on. Default value is 'cuda'.
+    :return: The best arrangement found by any run and its total familiarity under F.
+    :rtype: tuple
+    """
+    generator = torch.Generator(device=device).manual_seed(seed)
+    # Guest indices are kept as int64 because PyTorch only indexes with integer tensors of that type.
+    A = torch.as_tensor(starts, dtype=torch.int64, device=device).clone()
+    F = torch.as_tensor(F, dtype=torch.int64, device=device)
+    # The shared table is read-only, which PyTorch does not support, so it is copied while converting.
+    thresholds = torch.as_tensor(thresholds.astype(np.float32), device=device)
+    n_runs, n = A.shape
+    runs = torch.arange(n_runs, device=device)
+    seats = torch.arange(n, device=device)
+    current_familiarity = F[A, A.roll(-1, dims=1)].sum(dim=1)
+
+    for step in range(thresholds.shape[0] * steps_per_temperature):
+        level = step // steps_per_temperature
+        # j is picked among the other n - 1 seats, so it never equals i.
+        i = torch.randint(n, (n_runs,), device=device, generator=generator)
+        j = torch.randint(n - 1, (n_runs,), device=device, generator=generator)
+        j += j >= i
+        lo = torch.minimum(i, j)
+        hi = torch.maximum(i, j)
+
+        before_lo = A[runs, (lo - 1) % n]
+        after_hi = A[runs, (hi + 1) % n]
+        a_lo = A[runs, lo]
+        a_hi = A[runs, hi]
+        # Replacing the edge entering seat lo and the edge leaving seat hi is a 2-opt move, and also a swap of
+        # neighbouring seats.
+        outer_delta = (F[before_lo, a_hi] + F[a_lo, after_hi]) - (F[before_lo, a_lo] + F[a_hi, after_hi])
+        wraps = (lo == 0) & (hi == n - 1)
+        if two_opt:
+            # Reversing the whole table leaves every neighbour in place, so the move changes nothing. The formula
+            # would read the diagonal there instead, which can fall outside the threshold table.
+            delta = torch.where(wraps, 0, outer_delta)
+        else:
+            after_lo = A[runs, lo + 1]
+            before_hi = A[runs, hi - 1]
+            wrap_delta = (F[before_hi, a_lo] + F[a_hi, after_lo]) - (F[before_hi, a_hi] + F[a_lo, after_lo])
+            full_delta = ((F[before_lo, a_hi] + F[a_hi, after_lo] + F[before_hi, a_lo] + F[a_lo, after_hi])
+                          - (F[before_lo, a_lo] + F[a_lo, after_lo] + F[before_hi, a_hi] + F[a_hi, after_hi]))
+            delta = torch.where(hi == lo + 1, outer_delta, torch.where(wraps, wrap_delta, full_delta))
+
+        uniform = torch.rand(n_runs, device=device, generator=generator)
+        accept = (delta > 0) | (uniform < thresholds[level, (-delta).clamp(min=0)])
+        if two_opt:
+            accept &= ~wraps
+            # Seat k of an accepted run takes the guest from seat lo + hi - k when k lies in lo ... hi.
+            reverse = accept[:, None] & (seats >= lo[:, None]) & (seats <= hi[:, None])
+            A = A.gather(1, torch.where(reverse, lo[:, None] + hi[:, None] - seats, seats))
+        else:
+            accepted = runs[accept]
+            lo, hi = lo[accept], hi[accept]
+            A[accepted, lo], A[accepted, hi] = A[accepted, hi], A[accepted, lo]
+        current_familiarity += torch.where(accept, delta, 0)
+
+    best = torch.argmax(current_familiarity)
+    return A[best].cpu().numpy().astype(np.int8), int(current_familiarity[best])
@@ -0,0 +1,14 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def use_familiarity(monkeypatch):
+    """
+    Install a familiarity matrix as the module-level one `main` reads.
+    """
+    def install(familiarity):
+        monkeypatch.setattr(main, 'familiarity', familiarity, raising=False)
+        return familiarity
+    return install
@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def make_familiarity(n, low=1, high=5, seed=0):
+    """
+    Build a random symmetric familiarity matrix with ratings from low to high and zeros on the diagonal.
+    """
+    rng = np.random.default_rng(seed)
+    familiarity = np.triu(rng.integers(low, high + 1, (n, n)), k=1).astype(np.int8)
+    return familiarity + familiarity.T
+
+
+def total_familiarity(familiarity, arrangement):
+    """
+    Recompute the total familiarity of an arrangement from scratch.
+    """
+    return int(familiarity[arrangement, np.roll(arrangement, -1)].sum())
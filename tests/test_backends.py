@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import main
+from helpers import make_familiarity
+
+sa_core_nb = pytest.importorskip('sa_core_nb', exc_type=ImportError)
+pytest.importorskip('Cython')
+import pyximport  # noqa: E402
+
+pyximport.install(language_level=3)
+import sa_core_cy  # noqa: E402
+
+
+@pytest.mark.parametrize('n', [3, 4, 15])
+@pytest.mark.parametrize('sign', [1, -1])
+@pytest.mark.parametrize('two_opt', [True, False])
+def test_sa_core_parity(use_familiarity, n, sign, two_opt):
+    use_familiarity(make_familiarity(n))
+    tri = main.get_familiarity_triangle(sign)
+    thresholds = main.get_acceptance_thresholds(5.0, 0.01, 20, main.get_max_move_delta())
+    for seed in range(20):
+        numba_seats = np.random.default_rng(seed).permutation(n).astype(np.int8)
+        cython_seats = numba_seats.copy()
+
+        numba_total = sa_core_nb.sa_core(numba_seats, tri, thresholds, 100, seed, two_opt)
+        cython_total = sa_core_cy.sa_core(cython_seats, tri, thresholds, 100, seed, two_opt)
+
+        assert numba_total == cython_total
+        assert (numba_seats == cython_seats).all()
+
+
+def test_multistart_core_parity(use_familiarity):
+    use_familiarity(make_familiarity(15))
+    tri = main.get_familiarity_triangle()
+    thresholds = main.get_acceptance_thresholds(5.0, 0.01, 20, main.get_max_move_delta())
+    starts = np.tile(np.arange(15, dtype=np.int8), (30, 1))
+
+    numba_best, numba_total = sa_core_nb.multistart_core(starts, tri, thresholds, 100, 7, True)
+    cython_best, cython_total = sa_core_cy.multistart_core(starts, tri, thresholds, 100, 7, True)
+
+    assert numba_total == cython_total
+    assert (numba_best == cython_best).all()
+
+
+@pytest.mark.parametrize('sign', [1, -1])
+def test_solve_exact_core_parity(sign):
+    familiarity = sign * make_familiarity(9)
+
+    numba_best, numba_total = sa_core_nb.solve_exact_core(familiarity)
+    cython_best, cython_total = sa_core_cy.solve_exact_core(familiarity)
+
+    assert numba_total == cython_total
+    assert (numba_best == cython_best).all()
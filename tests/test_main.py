@@ -0,0 +1,64 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import main
+from helpers import make_familiarity, total_familiarity
+
+
+@pytest.mark.parametrize('n', range(3, 9))
+@pytest.mark.parametrize('optimize', ['min', 'max'])
+def test_solve_exact_matches_brute_force(use_familiarity, n, optimize):
+    familiarity = use_familiarity(make_familiarity(n, seed=n))
+    best = max if optimize == 'max' else min
+    expected = best(total_familiarity(familiarity, np.array((0,) + rest))
+                    for rest in itertools.permutations(range(1, n)))
+
+    arrangement, found = main.solve_exact(optimize)
+
+    assert sorted(arrangement) == list(range(n))
+    assert found == expected == total_familiarity(familiarity, arrangement)
+
+
+@pytest.mark.parametrize('n', [3, 4, 15])
+@pytest.mark.parametrize('optimize', ['min', 'max'])
+@pytest.mark.parametrize('two_opt', [True, False])
+def test_simulated_annealing_tracks_total(use_familiarity, n, optimize, two_opt):
+    familiarity = use_familiarity(make_familiarity(n))
+    start = np.arange(n, dtype=np.int8)
+
+    arrangement, found = main.simulated_annealing(start, optimize, n_iters=2000, seed=1, two_opt=two_opt)
+
+    assert sorted(arrangement) == list(range(n))
+    assert found == total_familiarity(familiarity, arrangement)
+    assert (start == np.arange(n)).all()
+
+
+@pytest.mark.parametrize('optimize', ['min', 'max'])
+@pytest.mark.parametrize('two_opt', [True, False])
+def test_multistart_tracks_total(use_familiarity, optimize, two_opt):
+    familiarity = use_familiarity(make_familiarity(15))
+
+    arrangement, found = main.multistart(np.arange(15, dtype=np.int8), optimize, n_runs=20, n_iters=2000, seed=1,
+                                         two_opt=two_opt)
+
+    assert sorted(arrangement) == list(range(15))
+    assert found == total_familiarity(familiarity, arrangement)
+
+
+def test_acceptance_thresholds_have_one_row_per_temperature_level(use_familiarity):
+    use_familiarity(make_familiarity(15))
+
+    thresholds = main.get_acceptance_thresholds(5000, 0.01, 50, main.get_max_move_delta(), 4)
+
+    assert thresholds.shape == (50, main.get_max_move_delta() + 1)
+    assert not thresholds.flags.writeable
+
+
+@pytest.mark.parametrize('n_iters, reheats', [(0, 0), (3, 5), (300, 4)])
+def test_simulated_annealing_rejects_too_short_schedules(use_familiarity, n_iters, reheats):
+    use_familiarity(make_familiarity(15))
+
+    with pytest.raises(ValueError):
+        main.simulated_annealing(np.arange(15, dtype=np.int8), n_iters=n_iters, reheats=reheats)
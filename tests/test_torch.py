@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+import main
+from helpers import make_familiarity, total_familiarity
+
+pytest.importorskip('torch')
+
+
+# A narrow rating spread gives a small threshold table, which the diagonal of the familiarity matrix falls outside of.
+@pytest.mark.parametrize('n, low, high', [(15, 3, 5), (3, 1, 5)])
+@pytest.mark.parametrize('optimize', ['min', 'max'])
+@pytest.mark.parametrize('two_opt', [True, False])
+def test_multistart_on_torch_tracks_total(use_familiarity, n, low, high, optimize, two_opt):
+    familiarity = use_familiarity(make_familiarity(n, low, high))
+
+    arrangement, found = main.multistart(np.arange(n, dtype=np.int8), optimize, n_runs=50, n_iters=2000, seed=1,
+                                         two_opt=two_opt, device='cpu')
+
+    assert sorted(arrangement) == list(range(n))
+    assert found == total_familiarity(familiarity, arrangement)